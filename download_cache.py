@@ -0,0 +1,66 @@
+"""On-disk cache and throttling retry around yf.download, shared by the scripts in this folder."""
+
+from datetime import datetime
+import hashlib
+import os
+import random
+import threading
+import time
+
+import pandas as pd
+import yfinance as yf
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "breakeven")
+CACHE_MAX_AGE = 3600  # seconds before a download that includes today is refreshed
+HISTORY_MAX_AGE = 86400  # seconds before a closed historical range is refreshed
+# Tickers per yf.download call. yfinance still sends one chart request per ticker over its thread pool,
+# so this only sets how many tickers are cached, retried and reported on as one unit.
+DOWNLOAD_BATCH_SIZE = 50
+DOWNLOAD_ATTEMPTS = 3
+DOWNLOAD_BACKOFF = 0.5  # seconds, doubled after each empty download and jittered
+
+# Frames already loaded this run, keyed like the disk cache, so repeat lookups skip the pickle read
+downloaded_frames = {}
+
+
+def cached_download(tickers, start, end, **kwargs):
+    """Wrap yf.download with an on-disk cache keyed by tickers, date range and options."""
+    options = {'progress': False, **kwargs}
+    start = pd.Timestamp(start).strftime("%Y-%m-%d")
+    end = pd.Timestamp(end).strftime("%Y-%m-%d")
+    key = f"{tickers}|{start}|{end}|{sorted(options.items())}"
+    if key in downloaded_frames:
+        return downloaded_frames[key]
+    path = os.path.join(CACHE_DIR, hashlib.md5(key.encode()).hexdigest() + ".pkl")
+
+    # Adjusted prices are restated after every later dividend or split, so even closed ranges expire;
+    # ranges reaching today also pick up the latest session, so they expire sooner
+    if os.path.exists(path):
+        is_historical = end <= datetime.today().strftime("%Y-%m-%d")
+        max_age = HISTORY_MAX_AGE if is_historical else CACHE_MAX_AGE
+        if time.time() - os.path.getmtime(path) < max_age:
+            try:
+                downloaded_frames[key] = pd.read_pickle(path)
+                return downloaded_frames[key]
+            except Exception:
+                pass  # truncated or unreadable entry; download it again
+
+    # yfinance swallows HTTP 429s and returns an empty frame, so back off and retry on empty results
+    backoff = DOWNLOAD_BACKOFF
+    for attempt in range(DOWNLOAD_ATTEMPTS):
+        data = yf.download(tickers, start=start, end=end, **options)
+        if not data.empty or attempt == DOWNLOAD_ATTEMPTS - 1:
+            break
+        # Jitter keeps concurrent workers and retries from hitting Yahoo in lockstep
+        time.sleep(backoff + random.uniform(0, backoff))
+        backoff *= 2
+
+    # Empty results are never cached, so the next call gets a fresh attempt
+    if not data.empty:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write beside the entry and swap it in, so a concurrent or interrupted run never leaves half a pickle
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        downloaded_frames[key] = data
+    return data
@@ -1,284 +1,257 @@
 # Complete, optimized and debugged version of the breakeven calculator and benchmark comparison script
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import csv
+import numpy as np
 import pandas as pd
-import yfinance as yf
+import math
 import os
 import time
-import random
 import argparse
 
+from download_cache import DOWNLOAD_BATCH_SIZE, cached_download
+
 # Constants
 SAVINGS_RATE = 0.05
+LOG1P_DAILY = math.log1p(SAVINGS_RATE / 365)  # daily compounding: growth factor = exp(LOG1P_DAILY * days)
 DATE_FORMAT = "%b-%d-%Y"
 TODAY = datetime.today()
+TODAY_TS = pd.Timestamp(TODAY).normalize()
+END_TS = TODAY_TS + pd.Timedelta(days=1)  # exclusive end for downloads that should include today
+SP500_LIST_FILE = "sp500_list.csv"
+SP500_LIST_MAX_AGE = 86400  # seconds before the constituents list is fetched again
+SP500_LIST_COLUMNS = ['Symbol', 'Security', 'GICS Sector']  # shared with ind_spy.py, which reads the same file
 
 
-def process_symbol_lot(symbol, trade, today):
-    results = []
-    failures = []
-    yf_symbol = symbol.replace('.', '-')
-    purchase_date = trade['Purchase Date'].date()
-    investment_amount = trade['Original Cost Basis']
-
-    try:
-        data = yf.download(yf_symbol, start=purchase_date, end=today + pd.Timedelta(days=1),
-                           progress=False, auto_adjust=True)
-        if data.empty:
-            raise ValueError("No data returned for symbol on or after purchase date.")
-
-        price = data.loc[data.index >= pd.to_datetime(purchase_date), 'Close']
-        if price.empty:
-            raise ValueError("No price available on or after trade date.")
-
-        purchase_price = price.iloc[0].item()
-        current_price = data['Close'].iloc[-1].item()
-        shares = investment_amount / purchase_price
-        current_value = shares * current_price
-        percent_change = ((current_value - investment_amount) / investment_amount) * 100
-
-        results.append({
-            'Symbol': symbol,
-            'Purchase Date': purchase_date.strftime("%Y-%m-%d"),
-            'Investment Amount': investment_amount,
-            'Current Value': round(current_value, 2),
-            'Percent Change': round(percent_change, 2)
-        })
-
-    except Exception as e:
-        failures.append({
-            'Symbol': symbol,
-            'Date': purchase_date,
-            'Error': str(e)
-        })
-
-    return results, failures
-
-
-def retry_failed_symbols_once(failures, trades, today):
-    retry_results = []
-    retry_failures = []
+def lot_arrays(trades):
+    """Flatten trades into the arrays compare_symbol_lots works on, once per run rather than per symbol."""
+    purchase_dates = pd.DatetimeIndex([t['Purchase Date'] for t in trades])
+    date_labels = np.asarray(purchase_dates.strftime("%Y-%m-%d"), dtype=object)
+    investment_amounts = np.fromiter((t['Original Cost Basis'] for t in trades), dtype=np.float64, count=len(trades))
+    return purchase_dates, date_labels, investment_amounts
 
-    symbols_to_retry = list(set(f['Symbol'] for f in failures if f['Symbol']))
-    print(f"\n🔁 Retrying {len(symbols_to_retry)} failed tickers...")
+def compare_symbol_lots(symbol, data, lots):
+    purchase_dates, date_labels, investment_amounts = lots
+    closes = data['Close'].to_numpy(dtype=np.float64).ravel()
 
-    def retry(symbol):
-        return process_sp500_symbol(symbol, trades, today)
+    # Resolve every lot's purchase price with one binary search over the trading days
+    positions = data.index.searchsorted(purchase_dates)
+    found = positions < len(closes)
+    investment_amounts = investment_amounts[found]
 
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        futures = {executor.submit(retry, symbol): symbol for symbol in symbols_to_retry}
+    current_values = investment_amounts / closes[positions[found]] * closes[-1]
+    percent_changes = (current_values - investment_amounts) / investment_amounts * 100
 
-        for count, future in enumerate(as_completed(futures), 1):
-            symbol = futures[future]
-            try:
-                results, failures = future.result()
-                retry_results.extend(results)
-                retry_failures.extend(failures)
-            except Exception as e:
-                retry_failures.append({'Symbol': symbol, 'Date': '', 'Error': str(e)})
+    failures = [{
+        'Symbol': symbol,
+        'Date': purchase_date.date(),
+        'Error': "No price available on or after trade date."
+    } for purchase_date in purchase_dates[~found]]
 
-            if count % 5 == 0 or count == len(symbols_to_retry):
-                print(f"Retry Progress: {count}/{len(symbols_to_retry)} completed")
+    results = pd.DataFrame({
+        'Symbol': symbol,
+        'Purchase Date': date_labels[found],
+        'Investment Amount': investment_amounts,
+        'Current Value': current_values.round(2),
+        'Percent Change': percent_changes.round(2)
+    })
+    return results, failures
 
-    return retry_results, retry_failures
+def download_sp500_batch(symbols, start):
+    yf_symbols = [symbol.replace('.', '-') for symbol in symbols]
+    return cached_download(' '.join(yf_symbols), start=start, end=END_TS,
+                           group_by='ticker', auto_adjust=True, threads=True)
 
-def process_sp500_symbol(symbol, trades, today):
+def compare_sp500_batch(symbols, batch_data, lots):
     results = []
     failures = []
 
-    yf_symbol = symbol.replace('.', '-')
-    try:
-        data = yf.download(yf_symbol, start=min(t['Purchase Date'] for t in trades).date(),
-                           end=today + pd.Timedelta(days=1), progress=False, auto_adjust=True)
-        if data.empty:
-            raise ValueError("Empty data returned")
+    for symbol in symbols:
+        try:
+            data = batch_data[symbol.replace('.', '-')].dropna()
+            if data.empty:
+                raise ValueError("Empty data returned")
+        except Exception as e:
+            failures.append({
+                'Symbol': symbol,
+                'Date': '',
+                'Error': str(e)
+            })
+            continue
 
-        for trade in trades:
-            purchase_date = trade['Purchase Date'].date()
-            investment_amount = trade['Original Cost Basis']
+        symbol_results, symbol_failures = compare_symbol_lots(symbol, data, lots)
+        results.append(symbol_results)
+        failures.extend(symbol_failures)
 
-            try:
-                purchase_price = data.loc[data.index >= pd.to_datetime(purchase_date), 'Close'].iloc[0].item()
-                current_price = data['Close'].iloc[-1].item()
-                shares = investment_amount / purchase_price
-                current_value = shares * current_price
-                percent_change = ((current_value - investment_amount) / investment_amount) * 100
-
-                results.append({
-                    'Symbol': symbol,
-                    'Purchase Date': purchase_date.strftime("%Y-%m-%d"),
-                    'Investment Amount': investment_amount,
-                    'Current Value': round(current_value, 2),
-                    'Percent Change': round(percent_change, 2)
-                })
-            except Exception as e:
-                failures.append({
-                    'Symbol': symbol,
-                    'Date': purchase_date,
-                    'Error': str(e)
-                })
-
-    except Exception as e:
-        failures.append({
-            'Symbol': symbol,
-            'Date': '',
-            'Error': str(e)
-        })
-#    time.sleep(random.uniform(0.1, 0.3))  # Sleep 100–300 ms
-    time.sleep(random.uniform(1.0, 20.0))  # Sleep between 1000ms and 9000ms
-    time.sleep(9.0)  # Exactly 5 seconds
     return results, failures
 
-
 def get_output_filename(prefix="breakeven_output"):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     return f"{prefix}_{timestamp}.csv"
 
-def compute_interest_adjusted_cost(purchase_date, cost_basis_total):
-    days_held = (TODAY - purchase_date).days
-    interest = cost_basis_total * ((1 + SAVINGS_RATE / 365) ** days_held - 1)
-    return cost_basis_total + interest
-
-def parse_line(line):
-    parts = line.strip().split('\t')
-    purchase_date = datetime.strptime(parts[0], DATE_FORMAT)
-    quantity = int(parts[5])
-    cost_basis_total = float(parts[7].replace('$','').replace(',',''))
-    return purchase_date, quantity, cost_basis_total
+def compute_days_held(purchase_dates, end_date=TODAY):
+    # Works on a single datetime or an array of them; returns whole days as int64
+    end = np.datetime64(end_date.date(), 'D')
+    return (end - np.asarray(purchase_dates, dtype='datetime64[D]')).astype(np.int64)
+
+def compute_interest(cost_basis_totals, days_held):
+    # expm1 avoids the cancellation in (1 + r/365) ** days - 1 for small rates
+    return cost_basis_totals * np.expm1(LOG1P_DAILY * days_held)
+
+def compute_interest_adjusted_cost(purchase_dates, cost_basis_totals):
+    days_held = compute_days_held(purchase_dates)
+    return cost_basis_totals + compute_interest(cost_basis_totals, days_held)
+
+def parse_input_file(input_filename):
+    """Parse the tab-separated Fidelity lots into date, quantity and cost basis arrays."""
+    # Fields are split on tabs only, so a stray quote in a free-text column is kept as text
+    lots = pd.read_csv(input_filename, sep='\t', header=None, usecols=[0, 5, 7], dtype=str, skip_blank_lines=True,
+                       quoting=csv.QUOTE_NONE)
+    # Whitespace-only lines read back as NaN and are skipped like blank ones
+    first_col = lots[0].fillna('').str.strip()
+    lots = lots[(first_col != '') & ~first_col.str.lower().str.startswith('acquired')]
+
+    purchase_dates = pd.to_datetime(lots[0].str.strip(), format=DATE_FORMAT).to_numpy(dtype='datetime64[D]')
+    quantities = lots[5].astype(np.int64).to_numpy()
+    cost_basis_totals = lots[7].str.replace(r'[$,]', '', regex=True).astype(np.float64).to_numpy()
+    return purchase_dates, quantities, cost_basis_totals
 
 def compare_against_benchmark(trades):
     symbols_input = input("Enter one or more benchmark symbols (comma-separated). SPY will always be included: ")
     user_symbols = [s.strip().upper() for s in symbols_input.split(',') if s.strip()]
     symbols = ['SPY'] + [s for s in user_symbols if s != 'SPY']
 
-    today = datetime.today().date()
-    results = []
+    frames = []
 
+    # One request covers every user benchmark from the earliest purchase date; each lot is sliced from it.
+    # SPY is requested on its own with the same arguments as get_spy_performance, so it comes from the cache.
+    batches = [['SPY'], symbols[1:]] if len(symbols) > 1 else [['SPY']]
+    batch_data = {}
+    for batch in batches:
+        try:
+            downloaded = download_benchmarks(batch, trades)
+        except Exception:
+            continue
+        for symbol in batch:
+            if symbol in downloaded.columns.get_level_values(0):
+                batch_data[symbol] = downloaded[symbol]
+
+    lots = lot_arrays(trades)
     for symbol in symbols:
-        for trade in trades:
-            purchase_date = trade['Purchase Date'].date()
-            investment_amount = trade['Original Cost Basis']
-            try:
-                data = yf.download(symbol, start=purchase_date, end=today + pd.Timedelta(days=1), progress=False, auto_adjust=True)
-                if data.empty:
-                    continue
-                purchase_price = data.loc[data.index >= pd.to_datetime(purchase_date), 'Close'].iloc[0].item()
-                current_price = data['Close'].iloc[-1].item()
-                shares = investment_amount / purchase_price
-                current_value = shares * current_price
-                percent_change = ((current_value - investment_amount) / investment_amount) * 100
-                results.append({
-                    'Symbol': symbol,
-                    'Purchase Date': purchase_date.strftime("%Y-%m-%d"),
-                    'Investment Amount': investment_amount,
-                    'Current Value': round(current_value, 2),
-                    'Percent Change': round(percent_change, 2)
-                })
-            except Exception:
-                continue
-
-    benchmark_df = pd.DataFrame(results)
+        try:
+            data = batch_data[symbol].dropna()
+        except KeyError:
+            continue
+        if data.empty:
+            continue
+
+        symbol_results, _ = compare_symbol_lots(symbol, data, lots)
+        frames.append(symbol_results)
+
+    benchmark_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
     return benchmark_df, symbols
 
+def download_benchmarks(symbols, trades):
+    return cached_download(' '.join(symbols), start=min(t['Purchase Date'] for t in trades),
+                           end=END_TS, group_by='ticker', auto_adjust=True, threads=True)
+
 def get_spy_performance(trades):
-    spy_data = yf.download('SPY', start=min(t['Purchase Date'] for t in trades).date(),
-                           end=datetime.today().date() + pd.Timedelta(days=1),
-                           progress=False, auto_adjust=True)
-    spy_returns = {}
-    for trade in trades:
-        purchase_date = trade['Purchase Date'].date()
-        try:
-            purchase_price = spy_data.loc[spy_data.index >= pd.to_datetime(purchase_date), 'Close'].iloc[0].item()
-            current_price = spy_data['Close'].iloc[-1].item()
-            percent_change = ((current_price - purchase_price) / purchase_price) * 100
-            spy_returns[trade['Purchase Date'].strftime("%Y-%m-%d")] = round(percent_change, 2)
-        except Exception:
-            spy_returns[trade['Purchase Date'].strftime("%Y-%m-%d")] = None
+    # Lots bought on the same day share one lookup
+    purchase_dates = pd.DatetimeIndex(sorted({t['Purchase Date'] for t in trades}))
+    spy_returns = dict.fromkeys(purchase_dates.strftime("%Y-%m-%d"))
+
+    try:
+        spy_data = download_benchmarks(['SPY'], trades)['SPY'].dropna()
+    except Exception:
+        return spy_returns
+    closes = spy_data['Close'].to_numpy(dtype=np.float64).ravel()
+    if not len(closes):
+        return spy_returns
+
+    positions = spy_data.index.searchsorted(purchase_dates)
+    found = positions < len(closes)
+    purchase_prices = closes[positions[found]]
+    percent_changes = ((closes[-1] - purchase_prices) / purchase_prices * 100).round(2)
+    spy_returns.update(zip(purchase_dates[found].strftime("%Y-%m-%d"), percent_changes.tolist()))
     return spy_returns
 
 def fetch_sp500_list():
+    # The constituents change a few times a year, so a list fetched within the last day is reused
+    if os.path.exists(SP500_LIST_FILE) and time.time() - os.path.getmtime(SP500_LIST_FILE) < SP500_LIST_MAX_AGE:
+        print(f"✅ Using cached S&P 500 list from '{SP500_LIST_FILE}'")
+        return
+
     url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
     try:
-        tables = pd.read_html(url)
-        sp500_table = tables[0]
-        sp500_table.to_csv("sp500_list.csv", index=False)
-        print("✅ S&P 500 list saved to 'sp500_list.csv'")
+        # Only the constituents table is parsed, and only the columns either script reads are kept
+        tables = pd.read_html(url, match="Symbol", attrs={"id": "constituents"})
+        sp500_table = tables[0][SP500_LIST_COLUMNS]
+        sp500_table.to_csv(SP500_LIST_FILE, index=False)
+        print(f"✅ S&P 500 list saved to '{SP500_LIST_FILE}'")
     except Exception as e:
         print(f"Error fetching S&P 500 list: {e}")
 
 def compare_sp500_performance(trades):
-    import time
-    import pandas as pd
-    from datetime import datetime
-    import yfinance as yf
-
     try:
-        sp500_df = pd.read_csv("sp500_list.csv")
+        sp500_df = pd.read_csv(SP500_LIST_FILE, usecols=['Symbol'], dtype={'Symbol': 'string'})
     except FileNotFoundError:
-        print("Error: 'sp500_list.csv' not found. Please run fetch_sp500_list() first.")
+        print(f"Error: '{SP500_LIST_FILE}' not found. Please run fetch_sp500_list() first.")
         return
 
     symbols = sp500_df['Symbol'].dropna().unique().tolist()
-    today = datetime.today().date()
-    all_results = []
+    filename = f"sp500_comparison_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    rows_written = 0
+    header_written = False
     all_failures = []
 
-    print(f"🔄 Running single-threaded, high-accuracy S&P 500 comparison...")
+    # Download tickers in batches from the earliest purchase date; yfinance fetches each batch in one call
+    global_start = min(t['Purchase Date'] for t in trades)
+    lots = lot_arrays(trades)
+    batches = [symbols[i:i + DOWNLOAD_BATCH_SIZE] for i in range(0, len(symbols), DOWNLOAD_BATCH_SIZE)]
+    print(f"🔄 Running batched S&P 500 comparison ({len(batches)} batches of up to {DOWNLOAD_BATCH_SIZE} tickers)...")
 
     count = 0
     total = len(symbols) * len(trades)
 
-    for symbol in symbols:
-        yf_symbol = symbol.replace('.', '-')
-        for trade in trades:
-            purchase_date = trade['Purchase Date'].date()
-            investment_amount = trade['Original Cost Basis']
+    # A single background worker downloads the next batch while this thread compares the current one.
+    # Rate limiting is left to cached_download, which backs off only when Yahoo actually throttles.
+    # Results are streamed to the CSV as each batch completes instead of being held in memory.
+    with open(filename, 'w', newline='') as out, ThreadPoolExecutor(max_workers=1) as executor:
+        writer = csv.writer(out)
+        pending = executor.submit(download_sp500_batch, batches[0], global_start) if batches else None
 
+        for batch_num, batch in enumerate(batches, 1):
             try:
-                data = yf.download(yf_symbol, start=purchase_date, end=today + pd.Timedelta(days=1),
-                                   progress=False, auto_adjust=True)
-                if data.empty:
-                    raise ValueError("No data returned for symbol on or after purchase date.")
-
-                price = data.loc[data.index >= pd.to_datetime(purchase_date), 'Close']
-                if price.empty:
-                    raise ValueError("No price available on or after trade date.")
-
-                purchase_price = price.iloc[0].item()
-                current_price = data['Close'].iloc[-1].item()
-                shares = investment_amount / purchase_price
-                current_value = shares * current_price
-                percent_change = ((current_value - investment_amount) / investment_amount) * 100
-
-                all_results.append({
-                    'Symbol': symbol,
-                    'Purchase Date': purchase_date.strftime("%Y-%m-%d"),
-                    'Investment Amount': investment_amount,
-                    'Current Value': round(current_value, 2),
-                    'Percent Change': round(percent_change, 2)
-                })
-
+                batch_data = pending.result()
             except Exception as e:
-                all_failures.append({
-                    'Symbol': symbol,
-                    'Date': purchase_date,
-                    'Error': str(e)
-                })
-
-            count += 1
-            if count % 25 == 0 or count == total:
-                print(f"Progress: {count}/{total} symbol-lot comparisons completed...")
-
-            # Sleep to avoid DNS overload or rate-limits
-            time.sleep(1.0)
-
-    if all_results:
-        df = pd.DataFrame(all_results)
+                batch_data = None
+                all_failures.extend({'Symbol': symbol, 'Date': '', 'Error': str(e)} for symbol in batch)
+
+            if batch_num < len(batches):
+                pending = executor.submit(download_sp500_batch, batches[batch_num], global_start)
+
+            if batch_data is not None:
+                results, failures = compare_sp500_batch(batch, batch_data, lots)
+                for symbol_results in results:
+                    if not header_written:
+                        writer.writerow(symbol_results.columns)
+                        header_written = True
+                    writer.writerows(symbol_results.itertuples(index=False, name=None))
+                    rows_written += len(symbol_results)
+                all_failures.extend(failures)
+
+            count += len(batch) * len(trades)
+            print(f"Progress: {count}/{total} symbol-lot comparisons completed...")
+
+    if rows_written:
+        # Sort once on the finished file, reading it back into typed columns
+        df = pd.read_csv(filename, dtype={'Symbol': str, 'Purchase Date': str}, keep_default_na=False)
         df.sort_values(by='Percent Change', ascending=False, inplace=True)
-        filename = f"sp500_comparison_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         df.to_csv(filename, index=False)
         print(f"\n✅ Accurate S&P 500 performance comparison saved to '{filename}'")
+    else:
+        os.remove(filename)
 
     if all_failures:
         fail_df = pd.DataFrame(all_failures)
@@ -286,60 +259,38 @@ def compare_sp500_performance(trades):
         fail_df.to_csv(fail_filename, index=False)
         print(f"⚠️  Remaining failed comparisons saved to '{fail_filename}'")
 
-def parse_cost_basis(val):
-    if isinstance(val, (int, float)):
-        return val
-    return float(str(val).replace('$', '').replace(',', ''))
-
-def project_future_values(results, future_disposal_date, symbol):
+def project_future_values(lots_df, future_disposal_date, symbol):
     """Compute future interest and adjusted cost for each lot and return rows."""
-    future_rows = []
-
-    # ✅ Filter valid trade rows (exclude TOTAL or separator rows)
-
-    trade_lots = [
-        r for r in results
-        if isinstance(r.get('Quantity'), (int, float))
-        and isinstance(r.get('Purchase Date'), str)
-        and r['Purchase Date'] not in ['TOTAL', '---']
-    ]
-    total_quantity = sum(r['Quantity'] for r in trade_lots)
-
-    total_cost_basis = sum(parse_cost_basis(r['Original Cost Basis']) for r in trade_lots)
-    avg_cost_basis_per_share = round(total_cost_basis / total_quantity, 2)
-
-    total_future_interest = 0.0
-    total_future_adjusted_cost = 0.0
-
-    for trade in trade_lots:
-        purchase_date = datetime.strptime(trade['Purchase Date'], "%Y-%m-%d")
-        
-        cost_basis = parse_cost_basis(trade['Original Cost Basis'])
-
-
-        quantity = trade['Quantity']
-
-        days_held_future = (future_disposal_date - purchase_date).days
-        future_interest = cost_basis * ((1 + SAVINGS_RATE / 365) ** days_held_future - 1)
-        future_adjusted_cost = cost_basis + future_interest
-
-        total_future_interest += future_interest
-        total_future_adjusted_cost += future_adjusted_cost
+    purchase_dates = np.asarray(lots_df['Purchase Date'], dtype='datetime64[D]')
+    quantities = lots_df['Quantity'].to_numpy(dtype=np.int64)
+    cost_bases = lots_df['Original Cost Basis'].to_numpy(dtype=np.float64)
+
+    # Project every lot to the disposal date in one vectorized pass
+    days_held_future = compute_days_held(purchase_dates, future_disposal_date)
+    future_interest = compute_interest(cost_bases, days_held_future)
+    future_adjusted_costs = cost_bases + future_interest
+
+    total_quantity = quantities.sum()
+    avg_cost_basis_per_share = round(cost_bases.sum() / total_quantity, 2)
+    total_future_interest = future_interest.sum()
+    total_future_adjusted_cost = future_adjusted_costs.sum()
+
+    future_df = pd.DataFrame({
+        'Symbol': lots_df['Symbol'].to_numpy(),
+        'Purchase Date': np.datetime_as_string(purchase_dates, unit='D'),
+        'Quantity': quantities,
+        'Original Cost Basis': cost_bases,
+        'Holding Duration (days)': [f"{days} (future)" for days in days_held_future],
+        'Interest Accrued': future_interest.round(2),
+        'Interest-Adjusted Total Cost': future_adjusted_costs.round(2),
+        'Breakeven Price': (future_adjusted_costs / quantities).round(4),
+        'Vs SPY (%)': 'N/A'
+    })
 
-        future_rows.append({
-            'Symbol': trade['Symbol'],
-            'Purchase Date': trade['Purchase Date'],
-            'Quantity': quantity,
-            'Original Cost Basis': cost_basis,
-            'Holding Duration (days)': f"{days_held_future} (future)",
-            'Interest Accrued': round(future_interest, 2),
-            'Interest-Adjusted Total Cost': round(future_adjusted_cost, 2),
-            'Breakeven Price': round(future_adjusted_cost / quantity, 4),
-            'Vs SPY (%)': 'N/A'
-        })
+    summary_rows = []
 
     # Add separator
-    future_rows.append({
+    summary_rows.append({
         'Symbol': '---',
         'Purchase Date': '---',
         'Quantity': '---',
@@ -352,7 +303,7 @@ def project_future_values(results, future_disposal_date, symbol):
     })
 
     # Add FUTURE TOTAL row
-    future_rows.append({
+    summary_rows.append({
         'Symbol': symbol,
         'Purchase Date': f"FUTURE ({future_disposal_date.strftime('%Y-%m-%d')})",
         'Quantity': total_quantity,
@@ -364,7 +315,7 @@ def project_future_values(results, future_disposal_date, symbol):
         'Vs SPY (%)': '---'
     })
 
-    return pd.DataFrame(future_rows)
+    return pd.concat([future_df, pd.DataFrame(summary_rows)], ignore_index=True)
 
 
 def main():
@@ -403,89 +354,77 @@ def main():
         else:
             future_disposal_date = datetime(TODAY.year, 12, 31)
 
-    results = []
-    benchmark_trades = []
-
     if not os.path.exists(input_filename):
         print(f"❌ Error: File '{input_filename}' not found.")
         return
 
-    with open(input_filename, 'r') as f:
-        for line in f:
-            if not line.strip() or line.lower().startswith('acquired'):
-                continue
-
-            purchase_date, quantity, cost_basis_total = parse_line(line)
-            adjusted_cost = compute_interest_adjusted_cost(purchase_date, cost_basis_total)
-            breakeven_price = adjusted_cost / quantity
-            days_held = (TODAY - purchase_date).days
-            interest_accrued = round(adjusted_cost - cost_basis_total, 2)
-
-            results.append({
-                'Symbol': main_symbol,
-                'Purchase Date': purchase_date.strftime("%Y-%m-%d"),
-                'Quantity': quantity,
-                'Original Cost Basis': round(cost_basis_total, 2),
-                'Holding Duration (days)': days_held,
-                'Interest Accrued': round(interest_accrued, 2),
-                'Interest-Adjusted Total Cost': round(adjusted_cost, 2),
-                'Breakeven Price': round(breakeven_price, 4)
-            })
-
-            benchmark_trades.append({
-                'Purchase Date': purchase_date,
-                'Original Cost Basis': cost_basis_total
-            })
+    purchase_dates, quantities, cost_basis_totals = parse_input_file(input_filename)
 
-    total_adjusted_cost = sum(r['Interest-Adjusted Total Cost'] for r in results)
-    total_quantity = sum(r['Quantity'] for r in results)
-    total_cost_basis = sum(r['Original Cost Basis'] for r in results if isinstance(r['Original Cost Basis'], (int, float)))
-    total_interest_accrued = sum(r['Interest Accrued'] for r in results if isinstance(r['Interest Accrued'], (int, float)))
-    avg_cost_basis_per_share = round(total_cost_basis / total_quantity, 2)
-    avg_sale_price_required = round(total_adjusted_cost / total_quantity, 4)
+    # Benchmark lookups work on midnight Timestamps, so convert once here
+    benchmark_trades = [
+        {'Purchase Date': purchase_date, 'Original Cost Basis': cost_basis_total}
+        for purchase_date, cost_basis_total in zip(pd.DatetimeIndex(purchase_dates), cost_basis_totals.tolist())
+    ]
 
-    results.append({
-        'Symbol': '---',
-        'Purchase Date': '---',
-        'Quantity': '---',
-        'Original Cost Basis': '---',
-        'Holding Duration (days)': '---',
-        'Interest Accrued': '---',
-        'Interest-Adjusted Total Cost': '---',
-        'Breakeven Price': '---'
-    })
+    # Compute interest and breakeven for every lot in one vectorized pass
+    days_held = compute_days_held(purchase_dates)
+    adjusted_costs = compute_interest_adjusted_cost(purchase_dates, cost_basis_totals)
 
-    results.append({
+    lots_df = pd.DataFrame({
         'Symbol': main_symbol,
-        'Purchase Date': 'TOTAL',
-        'Quantity': total_quantity,
-        'Original Cost Basis': f"${avg_cost_basis_per_share:,.2f}",
-        'Holding Duration (days)': '---',
-        'Interest Accrued': f"${total_interest_accrued:,.2f}",
-        'Interest-Adjusted Total Cost': f"${total_adjusted_cost:,.2f}",
-        'Breakeven Price': f"${avg_sale_price_required:,.2f}"
+        'Purchase Date': np.datetime_as_string(purchase_dates, unit='D'),
+        'Quantity': quantities,
+        'Original Cost Basis': cost_basis_totals.round(2),
+        'Holding Duration (days)': days_held,
+        'Interest Accrued': (adjusted_costs - cost_basis_totals).round(2),
+        'Interest-Adjusted Total Cost': adjusted_costs.round(2),
+        'Breakeven Price': (adjusted_costs / quantities).round(4)
     })
 
-    spy_performance = get_spy_performance(benchmark_trades)
-    for r in results:
-        if r['Purchase Date'] != '---':
-            spy_return = spy_performance.get(r['Purchase Date'], None)
-            r['Vs SPY (%)'] = round(-spy_return, 2) if spy_return is not None else 'N/A'
-        else:
-            r['Vs SPY (%)'] = '---'
+    # Column totals are taken from the numeric lot table before any marker rows are added
+    totals = lots_df[['Quantity', 'Original Cost Basis', 'Interest Accrued', 'Interest-Adjusted Total Cost']].sum()
+    total_quantity = int(totals['Quantity'])
+    total_adjusted_cost = totals['Interest-Adjusted Total Cost']
+    total_interest_accrued = totals['Interest Accrued']
+    avg_cost_basis_per_share = round(totals['Original Cost Basis'] / total_quantity, 2)
+    avg_sale_price_required = round(total_adjusted_cost / total_quantity, 4)
 
-    trade_df = pd.DataFrame(results)
+    spy_performance = get_spy_performance(benchmark_trades)
+    spy_returns = pd.to_numeric(lots_df['Purchase Date'].map(spy_performance))
+    lots_df['Vs SPY (%)'] = (-spy_returns).round(2).astype(object).where(spy_returns.notna(), 'N/A')
+
+    summary_rows = [
+        {
+            'Symbol': '---',
+            'Purchase Date': '---',
+            'Quantity': '---',
+            'Original Cost Basis': '---',
+            'Holding Duration (days)': '---',
+            'Interest Accrued': '---',
+            'Interest-Adjusted Total Cost': '---',
+            'Breakeven Price': '---',
+            'Vs SPY (%)': '---'
+        },
+        {
+            'Symbol': main_symbol,
+            'Purchase Date': 'TOTAL',
+            'Quantity': total_quantity,
+            'Original Cost Basis': f"${avg_cost_basis_per_share:,.2f}",
+            'Holding Duration (days)': '---',
+            'Interest Accrued': f"${total_interest_accrued:,.2f}",
+            'Interest-Adjusted Total Cost': f"${total_adjusted_cost:,.2f}",
+            'Breakeven Price': f"${avg_sale_price_required:,.2f}",
+            'Vs SPY (%)': 'N/A'
+        }
+    ]
 
-   
     # Insert a row of **** for spacing
-    label_row = pd.Series({col: '=====' for col in trade_df.columns})
+    label_row = {col: '=====' for col in lots_df.columns}
     label_row['Purchase Date'] = '=== Projected Future Values ==='
-    trade_df = pd.concat([trade_df, pd.DataFrame([label_row])], ignore_index=True)
 
-
-    # Compute and append future projection rows
-    future_df = project_future_values(results, future_disposal_date, main_symbol)
-    trade_df = pd.concat([trade_df, future_df], ignore_index=True)
+    # Compute the future projection rows and stitch all sections together in one concat
+    future_df = project_future_values(lots_df, future_disposal_date, main_symbol)
+    trade_df = pd.concat([lots_df, pd.DataFrame(summary_rows), pd.DataFrame([label_row]), future_df], ignore_index=True)
 
     # Rename columns
     trade_df.rename(columns={
@@ -499,17 +438,12 @@ def main():
         'Vs SPY (%)': 'SPY%'
     }, inplace=True)
 
-    # Format currency values
-    def format_currency(val):
-        return f"${val:,.2f}" if isinstance(val, (float, int)) else val
-
-    def format_price(val):
-        return f"${val:,.2f}" if isinstance(val, (float, int)) else val
-
-    trade_df['Cost-Basis'] = trade_df['Cost-Basis'].apply(format_currency)
-    trade_df['Int-Earned'] = trade_df['Int-Earned'].apply(format_currency)
-    trade_df['Cost-Basis+INT'] = trade_df['Cost-Basis+INT'].apply(format_currency)
-    trade_df['Min. Sell-Price'] = trade_df['Min. Sell-Price'].apply(format_price)
+    # Format currency values; marker and TOTAL rows already hold strings, so only numeric cells are touched
+    format_currency = '${:,.2f}'.format
+    for col in ['Cost-Basis', 'Int-Earned', 'Cost-Basis+INT', 'Min. Sell-Price']:
+        numeric = pd.to_numeric(trade_df[col], errors='coerce')
+        mask = numeric.notna()
+        trade_df.loc[mask, col] = numeric[mask].map(format_currency)
 
     print("\nTrade Summary:\n")
     print(trade_df.to_string(index=False))
@@ -520,16 +454,15 @@ def main():
         print("\nBenchmark Comparison (vs: " + ", ".join(benchmark_symbols) + "):\n")
         print(benchmark_df.to_string(index=False))
 
-        symbols_header = pd.DataFrame([{
-            'Symbol': f"Benchmarks used: {', '.join(benchmark_symbols)}"
-        }])
-        empty_row = pd.Series(dtype=object)
-        final_output = pd.concat([trade_df, pd.DataFrame([empty_row]), symbols_header, benchmark_df], ignore_index=True)
-    else:
-        final_output = trade_df
-
+    # Write each section straight to the file; the benchmark table keeps its own header
     output_file = get_output_filename()
-    final_output.to_csv(output_file, index=False)
+    with open(output_file, 'w', newline='') as out:
+        trade_df.to_csv(out, index=False)
+        if not benchmark_df.empty:
+            writer = csv.writer(out, lineterminator='\n')
+            writer.writerow([])
+            writer.writerow([f"Benchmarks used: {', '.join(benchmark_symbols)}"])
+            benchmark_df.to_csv(out, index=False)
     print(f"\n✅ Results saved to {output_file}")
 
     run_sp500 = input("\nWould you like to compare your investments against all S&P 500 stocks? (y/n): ").strip().lower()
@@ -1,85 +1,101 @@
 import pandas as pd
-import yfinance as yf
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import os
 import re
+import time
 
-def get_valid_date(hist, target_date, prefer='after'):
-    dates = hist.index
-    if prefer == 'after':
-        for date in dates:
-            if date >= target_date:
-                return date
-    else:
-        for date in reversed(dates):
-            if date <= target_date:
-                return date
-    return None
+from download_cache import DOWNLOAD_BATCH_SIZE, cached_download
+
+DOWNLOAD_WORKERS = 4  # batch requests in flight at once
+SP500_LIST_FILE = "sp500_list.csv"
+SP500_LIST_MAX_AGE = 86400  # seconds before the constituents list is fetched again
+SP500_LIST_COLUMNS = ['Symbol', 'Security', 'GICS Sector']
+
+# Growth figures stay numeric until they are printed or saved
+GROWTH_FORMATTERS = {
+    "Start Price": '${:,.2f}'.format,
+    "End Price": '${:,.2f}'.format,
+    "Final Value": '${:,.2f}'.format,
+    "Nominal % Growth": '{:.2f}%'.format,
+    "Dividend Reinvested % Growth": '{:.2f}%'.format
+}
 
 def clean_investment_amount(amount_str):
     amount_str = re.sub(r'[^\d.]', '', amount_str)
     return float(amount_str)
 
-def calculate_growth(symbol, start_date, end_date, investment_amount):
-    try:
-        ticker = yf.Ticker(symbol)
-        hist = ticker.history(
-            start=start_date.strftime("%Y-%m-%d"),
-            end=(end_date + pd.Timedelta(days=5)).strftime("%Y-%m-%d")
-        )
-        
-        if hist.empty or 'Close' not in hist.columns:
-            return None
-
-        hist.index = hist.index.tz_localize(None)
-
-        actual_start = get_valid_date(hist, start_date, prefer='after')
-        actual_end = get_valid_date(hist, end_date, prefer='before')
-
-        if not actual_start or not actual_end:
-            return None
-
-        start_price = hist.loc[actual_start, 'Close']
-        end_price = hist.loc[actual_end, 'Close']
-        nominal_growth = (end_price - start_price) / start_price * 100
-
-        units = investment_amount / start_price
-        dividends = hist.loc[actual_start:actual_end, 'Dividends']
-
-        for date, dividend in dividends.items():
-            if dividend > 0:
-                reinvest_price = hist.loc[date, 'Close']
-                units += (units * dividend) / reinvest_price
-
-        final_value = units * end_price
-        dividend_growth = (final_value - investment_amount) / investment_amount * 100
-
-        return {
-            "Symbol": symbol,
-            "Start Date": actual_start.date(),
-            "End Date": actual_end.date(),
-            "Duration (Days)": (actual_end - actual_start).days,
-            "Start Price": f"${start_price:,.2f}",
-            "End Price": f"${end_price:,.2f}",
-            "Final Value": f"${final_value:,.2f}",
-            "Nominal % Growth": f"{nominal_growth:.2f}%",
-            "Dividend Reinvested % Growth": f"{dividend_growth:.2f}%"
-        }
-    except Exception:
-        return None
+def download_history(symbols, start_date, end_date):
+    # One request for the whole batch; columns are (ticker, field) and include Dividends
+    return cached_download(' '.join(symbols), start=start_date, end=end_date + pd.Timedelta(days=5),
+                           group_by='ticker', actions=True, auto_adjust=True, threads=True)
+
+def calculate_growth(panel, symbols, start_date, end_date, investment_amount):
+    """Compute growth for every symbol of a batch panel at once; returns (results, missing symbols)."""
+    downloaded = set(panel.columns.get_level_values(0)) if not panel.empty else set()
+    present = [symbol for symbol in symbols if symbol in downloaded]
+    if not present:
+        return pd.DataFrame(), list(symbols)
+
+    # (dates x symbols) tables restricted to the holding window; NaN marks days a ticker did not trade
+    closes = panel.xs('Close', axis=1, level=1)[present].loc[start_date:end_date]
+    traded = closes.notna()
+    has_data = traded.any()
+    if not has_data.any():
+        # No bars in the window (weekend/holiday only, or end before start)
+        return pd.DataFrame(), list(symbols)
+    closes, traded = closes.loc[:, has_data], traded.loc[:, has_data]
+    dividends = panel.xs('Dividends', axis=1, level=1).loc[closes.index, closes.columns]
+
+    actual_start = traded.idxmax()
+    actual_end = traded[::-1].idxmax()
+    start_prices = closes.bfill().iloc[0]
+    end_prices = closes.ffill().iloc[-1]
+    nominal_growth = (end_prices - start_prices) / start_prices * 100
+
+    # Each dividend is reinvested at that day's close, growing the units by (1 + dividend / close)
+    growth_factors = (1.0 + dividends / closes).where((dividends > 0) & traded, 1.0).prod()
+    final_values = (investment_amount / start_prices * growth_factors) * end_prices
+    dividend_growth = (final_values - investment_amount) / investment_amount * 100
+
+    results = pd.DataFrame({
+        "Symbol": closes.columns,
+        "Start Date": actual_start.dt.date,
+        "End Date": actual_end.dt.date,
+        "Duration (Days)": (actual_end - actual_start).dt.days,
+        "Start Price": start_prices,
+        "End Price": end_prices,
+        "Final Value": final_values,
+        "Nominal % Growth": nominal_growth,
+        "Dividend Reinvested % Growth": dividend_growth
+    }).reset_index(drop=True)
+    missing = [symbol for symbol in symbols if symbol not in set(results['Symbol'])]
+    return results, missing
 
 def get_sp500_tickers(verbose=True, save_to_csv=True):
-    url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-    tables = pd.read_html(url, match="Symbol")
-    df = tables[0]
+    # The constituents change a few times a year, so a list saved within the last day is reused
+    df = None
+    if os.path.exists(SP500_LIST_FILE) and time.time() - os.path.getmtime(SP500_LIST_FILE) < SP500_LIST_MAX_AGE:
+        try:
+            df = pd.read_csv(SP500_LIST_FILE, usecols=SP500_LIST_COLUMNS)
+            save_to_csv = False
+            print(f"✅ Using cached S&P 500 list from {SP500_LIST_FILE}")
+        except ValueError:
+            pass  # saved without the sector columns, so fetch a full one
+
+    if df is None:
+        url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+        tables = pd.read_html(url, match="Symbol", attrs={"id": "constituents"})
+        df = tables[0][SP500_LIST_COLUMNS]
 
     if save_to_csv:
-        df.to_csv("sp500_list.csv", index=False)
-        print("✅ Saved S&P 500 list to sp500_list.csv")
+        df.to_csv(SP500_LIST_FILE, index=False)
+        print(f"✅ Saved S&P 500 list to {SP500_LIST_FILE}")
 
     if verbose:
+        # One write for the whole listing instead of a print per constituent
         print("\n📘 S&P 500 Constituents:")
-        for _, row in df.iterrows():
-            print(f"{row['Symbol']: <8} - {row['Security']}")
+        print((df['Symbol'].str.ljust(8) + " - " + df['Security']).str.cat(sep="\n"))
 
     return df[['Symbol', 'Security', 'GICS Sector']]
 
@@ -91,29 +107,57 @@ def analyze_sp500(start_date, end_date, investment_amount):
     failed = []
 
     total = len(df_info)
-    for idx, row in df_info.iterrows():
-        symbol = row['Yahoo Symbol']
-        print(f"[{idx + 1}/{total}] Fetching {symbol}...", end='\r')
-
-        result = calculate_growth(symbol, start_date, end_date, investment_amount)
-        if result:
-            result["Security"] = row['Security']
-            result["Sector"] = row['GICS Sector']
-            results.append(result)
-        else:
-            failed.append({
-                "Symbol": symbol,
-                "Company": row['Security'],
-                "Sector": row['GICS Sector'],
-                "Reason": "No data or price fetch failed"
-            })
+    batches = [df_info.iloc[start:start + DOWNLOAD_BATCH_SIZE] for start in range(0, total, DOWNLOAD_BATCH_SIZE)]
+    fetched = 0
+
+    # Keep several batch downloads in flight and process them in order as they land
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        futures = [
+            executor.submit(download_history, batch['Yahoo Symbol'].tolist(), start_date, end_date)
+            for batch in batches
+        ]
+
+        for batch, future in zip(batches, futures):
+            try:
+                panel = future.result()
+            except Exception:
+                panel = pd.DataFrame()
+
+            fetched += len(batch)
+            print(f"[{fetched}/{total}] Fetched {len(batch)} symbols...", end='\r')
+
+            try:
+                batch_results, missing = calculate_growth(
+                    panel, batch['Yahoo Symbol'].tolist(), start_date, end_date, investment_amount
+                )
+            except Exception:
+                # One bad batch is recorded as missing rather than aborting the whole sweep
+                batch_results, missing = pd.DataFrame(), batch['Yahoo Symbol'].tolist()
+            info = batch.set_index('Yahoo Symbol')
+            if not batch_results.empty:
+                batch_results["Security"] = info.loc[batch_results['Symbol'], 'Security'].to_numpy()
+                batch_results["Sector"] = info.loc[batch_results['Symbol'], 'GICS Sector'].to_numpy()
+                results.append(batch_results)
+
+            for symbol in missing:
+                failed.append({
+                    "Symbol": symbol,
+                    "Company": info.at[symbol, 'Security'],
+                    "Sector": info.at[symbol, 'GICS Sector'],
+                    "Reason": "No data or price fetch failed"
+                })
+
+    results = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+    if not results.empty:
+        # ~11 sectors across ~500 rows, so store them dictionary-encoded
+        results['Sector'] = results['Sector'].astype('category')
 
     if failed:
         pd.DataFrame(failed).to_csv("sp500_failed_fetches.csv", index=False)
         print(f"\n⚠️ Failed to fetch data for {len(failed)} symbols. Saved to sp500_failed_fetches.csv")
 
     print(f"\n✅ Successfully fetched data for {len(results)} / {len(df_info)} symbols.")
-    return pd.DataFrame(results)
+    return results
 
 # === Entry Point ===
 if __name__ == "__main__":
@@ -154,21 +198,25 @@ if __name__ == "__main__":
 
     # Run analysis
     df = analyze_sp500(start_date, end_date, investment_amount)
+    if df.empty:
+        print("❌ No growth data for the selected window.")
+        exit(1)
 
     # Sort by dividend-reinvested growth
-    df['Dividend Reinvested % Growth (Num)'] = df['Dividend Reinvested % Growth'].str.rstrip('%').astype(float)
-    df = df.sort_values(by='Dividend Reinvested % Growth (Num)', ascending=False)
-    df.drop(columns=['Dividend Reinvested % Growth (Num)'], inplace=True)
+    df = df.sort_values(by='Dividend Reinvested % Growth', ascending=False)
 
     # Display top and bottom 10
     print("\n🏆 Top 10 Performers:")
-    print(df.head(10).to_string(index=False))
+    print(df.head(10).to_string(index=False, formatters=GROWTH_FORMATTERS))
 
     print("\n📉 Bottom 10 Performers:")
-    print(df.tail(10).to_string(index=False))
+    print(df.tail(10).to_string(index=False, formatters=GROWTH_FORMATTERS))
 
     # Save results with timestamp
     timestamp = datetime.now().strftime("%Y-%m-%d_%H%M")
     file_name = f"sp500_growth_comparison_{timestamp}.csv"
-    df.to_csv(file_name, index=False)
+    formatted = df.copy()
+    for col, formatter in GROWTH_FORMATTERS.items():
+        formatted[col] = formatted[col].map(formatter)
+    formatted.to_csv(file_name, index=False)
     print(f"\n📁 Results saved to: {file_name}")
@@ -1,65 +1,64 @@
+import numpy as np
 import pandas as pd
-import yfinance as yf
 from datetime import datetime, timedelta
 from tqdm import tqdm
-import time
-
-def get_last_trading_day_before(target_date):
-    while True:
-        data = yf.download("SPY",
-                           start=target_date.strftime('%Y-%m-%d'),
-                           end=(target_date + timedelta(days=1)).strftime('%Y-%m-%d'),
-                           progress=False,
-                           auto_adjust=False)
-        if not data.empty:
-            return data.index[-1].strftime('%Y-%m-%d')
-        target_date -= timedelta(days=1)
-
-def get_price_on_or_before(symbol, target_date_str, cached_data=None):
-    target_date = datetime.strptime(target_date_str, '%Y-%m-%d')
-
-    if cached_data is not None:
-        try:
-            data = cached_data['Adj Close'].dropna()
-            filtered = data[data.index <= pd.to_datetime(target_date_str)]
-            if not filtered.empty:
-                return filtered.iloc[-1].item()
-        except Exception:
-            return None
-        return None
-
-    # fallback to on-demand download
-    try:
-        start_date = target_date - timedelta(days=30)
-        data = yf.download(symbol,
-                           start=start_date.strftime('%Y-%m-%d'),
-                           end=(target_date + timedelta(days=1)).strftime('%Y-%m-%d'),
-                           progress=False,
-                           auto_adjust=False)
-        if data.empty or 'Adj Close' not in data.columns:
-            return None
-        adj_close = data['Adj Close'].dropna()
-        if adj_close.empty:
-            return None
-        return adj_close.iloc[-1].item()
-    except Exception:
-        return None
-
-def format_currency(amount):
-    return f"${amount:,.2f}"
-
-def format_percent(value):
-    return f"{value:.2f}%"
-
-def safe_format_currency(x):
-    if pd.isna(x):
-        return ''
-    return format_currency(x)
-
-def safe_format_percent(x):
-    if pd.isna(x):
-        return ''
-    return format_percent(x)
+from concurrent.futures import ThreadPoolExecutor
+
+from download_cache import DOWNLOAD_BATCH_SIZE, cached_download
+
+TODAY = datetime.today()
+DOWNLOAD_WORKERS = 4  # batch requests in flight at once
+PRICE_LOOKBACK_DAYS = 30  # oldest close accepted for a date; also fetched before the first investment
+
+# Display formats for the money and growth columns; blank where a summary row has no value
+DISPLAY_FORMATTERS = {
+    'Initial Investment': '${:,.2f}'.format,
+    'Current Value': '${:,.2f}'.format,
+    '% Growth': '{:.2f}%'.format
+}
+
+def get_last_trading_day_before(prices, target_date):
+    """Last SPY session on or before target_date, read from the downloaded prices."""
+    if 'SPY' in prices.columns:
+        sessions = prices['SPY'].loc[:target_date].dropna()
+        if not sessions.empty:
+            return sessions.index[-1]
+    # Without SPY data, fall back to the last weekday
+    return pd.Timestamp(np.busday_offset(np.datetime64(target_date.date()), 0, roll='backward'))
+
+def download_adj_close(symbols, start_date, end_date):
+    """Download adjusted closes for all symbols as one (dates x symbols) table."""
+    start = start_date.strftime('%Y-%m-%d')
+    end = (end_date + timedelta(days=1)).strftime('%Y-%m-%d')
+    batches = [' '.join(symbols[i:i + DOWNLOAD_BATCH_SIZE]) for i in range(0, len(symbols), DOWNLOAD_BATCH_SIZE)]
+
+    # Batches are independent, so keep several requests in flight at once
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        panels = list(tqdm(executor.map(
+            lambda tickers: cached_download(tickers, start=start, end=end, group_by='ticker',
+                                            auto_adjust=False, threads=True),
+            batches
+        ), total=len(batches), desc="Downloading prices", leave=True))
+    frames = [panel.xs('Adj Close', axis=1, level=1) for panel in panels if not panel.empty]
+    return pd.concat(frames, axis=1).sort_index() if frames else pd.DataFrame()
+
+def get_prices_on_or_before(prices, symbols, dates):
+    """Look up the last adjusted close on or before each (symbol, date) pair; NaN where none is recent enough."""
+    if prices.empty:
+        return pd.Series(float('nan'), index=symbols.index)
+    # Per symbol, the row of its latest close as of each row (-1 before its first close)
+    closes = prices.to_numpy()
+    last_close = np.maximum.accumulate(np.where(np.isnan(closes), -1, np.arange(len(prices))[:, None]), axis=0)
+    rows = prices.index.searchsorted(dates, side='right') - 1
+    cols = prices.columns.get_indexer(symbols)
+    found = np.flatnonzero((rows >= 0) & (cols >= 0))
+    source, cols = last_close[rows[found], cols[found]], cols[found]
+    # Closes older than the lookback window are as good as missing
+    oldest = pd.DatetimeIndex(dates)[found] - timedelta(days=PRICE_LOOKBACK_DAYS)
+    fresh = (source >= 0) & (prices.index[np.maximum(source, 0)] >= oldest)
+    values = np.full(len(symbols), np.nan)
+    values[found[fresh]] = closes[source[fresh], cols[fresh]]
+    return pd.Series(values, index=symbols.index)
 
 def calculate_investment_performance(input_csv_path):
     user_input = input("Enter end date (YYYY-MM-DD), or press Enter to use the latest trading day: ").strip()
@@ -70,92 +69,66 @@ def calculate_investment_performance(input_csv_path):
             print("❌ Invalid date format. Use YYYY-MM-DD.")
             return
     else:
-        end_date = datetime.today()
-    end_date_str = get_last_trading_day_before(end_date)
+        end_date = TODAY
 
-    print(f"\n📅 Using end date: {end_date_str}")
-
-    df_input = pd.read_csv(input_csv_path)
+    df_input = pd.read_csv(input_csv_path, dtype={'Symbol': str, 'Amount Invested': 'float64'})
     df_input['Date Invested'] = pd.to_datetime(df_input['Date Invested'], format='%Y-%m-%d', errors='coerce')
+    df_input['Symbol'] = df_input['Symbol'].str.strip()
 
-    results = []
-    total_invested = 0
-    total_value = 0
-    total_spy_value = 0
+    # Rows without a valid investment date are left out of every total
+    df_valid = df_input[df_input['Date Invested'].notna()]
 
-    # Cache SPY data once
+    # One batched download covers every symbol plus the SPY benchmark, through the end date
+    # and any investment made after it
+    symbols = list(dict.fromkeys(df_valid['Symbol'].tolist() + ['SPY']))
     try:
-        spy_data = yf.download("SPY",
-                               start=df_input['Date Invested'].min().strftime('%Y-%m-%d'),
-                               end=(datetime.strptime(end_date_str, "%Y-%m-%d") + timedelta(days=1)).strftime('%Y-%m-%d'),
-                               progress=False,
-                               auto_adjust=False)
+        prices = download_adj_close(symbols,
+                                    df_valid['Date Invested'].min() - timedelta(days=PRICE_LOOKBACK_DAYS),
+                                    max(pd.Timestamp(end_date), df_valid['Date Invested'].max()))
     except Exception as e:
-        print(f"❌ Failed to cache SPY data: {e}")
-        spy_data = None
-
-    for _, row in tqdm(df_input.iterrows(), total=len(df_input), desc="Processing investments", leave=True):
-        symbol = row['Symbol']
-        investment_date = row['Date Invested']
-        if pd.isnull(investment_date):
-            continue
-        amount_invested = float(row['Amount Invested'])
-        investment_date_str = investment_date.strftime('%Y-%m-%d')
-        total_invested += amount_invested
+        print(f"❌ Failed to download price data: {e}")
+        prices = pd.DataFrame()
 
-        try:
-            start_price = get_price_on_or_before(symbol, investment_date_str)
-            if start_price is None:
-                print(f"⚠️ No data found for {symbol} on or before {investment_date_str}")
-                continue
-
-            shares_bought = amount_invested / start_price
-
-            end_price = get_price_on_or_before(symbol, end_date_str)
-            if end_price is None:
-                print(f"⚠️ No data found for {symbol} on or before {end_date_str}")
-                continue
-
-            current_value = shares_bought * end_price
-            percent_growth = ((current_value - amount_invested) / amount_invested) * 100
-            total_value += current_value
-
-            results.append({
-                'Symbol': symbol,
-                'Investment Date': investment_date_str,
-                'Start Price': round(start_price, 2),
-                'Shares Bought': round(shares_bought, 4),
-                'End Date': end_date_str,
-                'End Price': round(end_price, 2),
-                'Initial Investment': amount_invested,
-                'Current Value': current_value,
-                '% Growth': percent_growth
-            })
-
-        except Exception as e:
-            print(f"Error processing {symbol}: {e}")
-        time.sleep(0.1)
+    # The price history doubles as the trading calendar for the end date
+    end_date = get_last_trading_day_before(prices, end_date)
+    end_date_str = end_date.strftime('%Y-%m-%d')
+    print(f"\n📅 Using end date: {end_date_str}")
+
+    end_dates = pd.Series(end_date, index=df_valid.index)
+    start_prices = get_prices_on_or_before(prices, df_valid['Symbol'], df_valid['Date Invested'])
+    end_prices = get_prices_on_or_before(prices, df_valid['Symbol'], end_dates)
+    investment_dates = df_valid['Date Invested'].dt.strftime('%Y-%m-%d')
+
+    no_start = start_prices.isna()
+    missing = no_start | end_prices.isna()
+    for symbol, investment_date_str, missing_start in zip(df_valid['Symbol'][missing], investment_dates[missing], no_start[missing]):
+        print(f"⚠️ No data found for {symbol} on or before {investment_date_str if missing_start else end_date_str}")
+
+    priced = ~missing
+    amounts = df_valid['Amount Invested'][priced]
+    shares_bought = amounts / start_prices[priced]
+    current_values = shares_bought * end_prices[priced]
+    df_main = pd.DataFrame({
+        'Symbol': df_valid['Symbol'][priced],
+        'Investment Date': investment_dates[priced],
+        'Start Price': start_prices[priced].round(2),
+        'Shares Bought': shares_bought.round(4),
+        'End Date': end_date_str,
+        'End Price': end_prices[priced].round(2),
+        'Initial Investment': amounts,
+        'Current Value': current_values,
+        '% Growth': (current_values - amounts) / amounts * 100
+    })
 
     print("\n📈 Simulating SPY benchmark...")
-    for _, row in tqdm(df_input.iterrows(), total=len(df_input), desc="Simulating SPY benchmark", leave=True):
-        investment_date = row['Date Invested']
-        if pd.isnull(investment_date):
-            continue
-        amount_invested = float(row['Amount Invested'])
-        investment_date_str = investment_date.strftime('%Y-%m-%d')
+    spy = pd.Series("SPY", index=df_valid.index)
+    spy_start_prices = get_prices_on_or_before(prices, spy, df_valid['Date Invested'])
+    spy_end_prices = get_prices_on_or_before(prices, spy, end_dates)
+    # Rows without a SPY price on either date add nothing, as sum() skips NaN
+    total_spy_value = (df_valid['Amount Invested'] / spy_start_prices * spy_end_prices).sum()
 
-        try:
-            spy_start_price = get_price_on_or_before("SPY", investment_date_str, cached_data=spy_data)
-            spy_end_price = get_price_on_or_before("SPY", end_date_str, cached_data=spy_data)
-            if spy_start_price is not None and spy_end_price is not None:
-                spy_shares = amount_invested / spy_start_price
-                spy_value = spy_shares * spy_end_price
-                total_spy_value += spy_value
-        except Exception as e:
-            print(f"Error processing SPY for {investment_date_str}: {e}")
-        time.sleep(0.1)
-
-    df_main = pd.DataFrame(results)
+    total_invested = df_valid['Amount Invested'].sum()
+    total_value = current_values.sum()
 
     total_growth = ((total_value - total_invested) / total_invested) * 100 if total_invested else 0
     spy_growth = ((total_spy_value - total_invested) / total_invested) * 100 if total_invested else 0
@@ -197,13 +170,10 @@ def calculate_investment_performance(input_csv_path):
         }
     ]
 
-    df_summary = pd.DataFrame(summary_rows)
-    df_combined = pd.concat([df_main, df_summary], ignore_index=True)
-
-    df_display = df_combined.copy()
-    df_display['Initial Investment'] = df_display['Initial Investment'].apply(safe_format_currency)
-    df_display['Current Value'] = df_display['Current Value'].apply(safe_format_currency)
-    df_display['% Growth'] = df_display['% Growth'].apply(safe_format_percent)
+    # concat already returns a new frame, so it is formatted in place without another copy
+    df_display = pd.concat([df_main, pd.DataFrame(summary_rows)], ignore_index=True)
+    for col, formatter in DISPLAY_FORMATTERS.items():
+        df_display[col] = df_display[col].map(formatter, na_action='ignore').fillna('')
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_csv = f"portfolio_performance_{timestamp}.csv"
@@ -1,172 +1,201 @@
 import argparse
 import csv
 import os
-from datetime import datetime
+import re
+import sys
+import numpy as np
+from datetime import date, datetime
 from collections import defaultdict
-
-def clean_trade_date(date_str):
-    return date_str.split()[0]
-
-def parse_multiple_trades(content):
-    lines = [line.strip() for line in content.strip().split('\n') if line.strip()]
-    trades = []
-
-    i = 0
-    while i < len(lines):
-        if "Buy" in lines[i] or "Sell" in lines[i]:
-            trade = {}
-            date_action = lines[i].split()
-            trade['Trade date'] = clean_trade_date(date_action[0])
-            trade['Action'] = date_action[1]
-            i += 2
-
-            trade['Symbol'] = lines[i].strip()
-            i += 2
-
-            trade['Quantity'] = int(lines[i])
-            i += 1
-
-            price_total_parts = lines[i].split()
-            trade['Price'] = float(price_total_parts[0].replace('$', '').replace(',', ''))
-            trade['Total'] = float(price_total_parts[-1].replace('$', '').replace(',', ''))
-            trade['Commission'] = 0.00
-
-            trades.append(trade)
-        i += 1
-    return trades
-
-def calculate_interest(principal, trade_date_str, rate=0.05):
-    trade_date = datetime.strptime(trade_date_str, '%m/%d/%Y')
-    today = datetime.today()
-    days = (today - trade_date).days
-    interest = principal * rate * days / 365
-    return interest
-
-def calculate_breakeven(total, interest, quantity):
-    return round((abs(total) + interest) / quantity, 2)
-
-def export_summary_csv(symbol, lot_flags, summary_data):
-    now = datetime.now().strftime("%Y%m%d-%H%M%S")
-    filename = f"{symbol}-{now}.csv"
+from operator import attrgetter
+from typing import NamedTuple
+
+# Deletion table for the "$" and "," in amounts like "-$2,807.75"
+CURRENCY_CHARS = str.maketrans('', '', '$,')
+# A trade block starts with "MM/DD/YYYY[ as of MM/DD/YYYY]<tab>Buy|Sell"
+TRADE_HEADER = re.compile(r'(\d{2}/\d{2}/\d{4})\b.*\b(Buy|Sell)\b')
+TRADE_FIELDS = ('Trade date', 'Symbol', 'Action', 'Quantity', 'Price', 'Total', 'Commission')
+# Report line templates, formatted positionally from each trade or lot's values
+TRADE_LINE = "{:11} {:7} {:5} {:6.2f}   {:7.2f}     {:7.2f}\n"
+LOT_LINE = "{:11} {:5} {:7.2f}   {:7.2f}     {:7.2f}   {}\n"
+TRADES_CSV_BUFFER = 1 << 20  # bytes; a whole batch of trades.csv rows goes out in one write
+
+class Trade(NamedTuple):
+    """One parsed trade; the first len(TRADE_FIELDS) fields are its trades.csv row."""
+    trade_date: str
+    symbol: str
+    action: str
+    quantity: int
+    price: float
+    total: float
+    commission: float
+    cost: float  # abs(total)
+
+def parse_multiple_trades(lines, trades=None, grouped=None):
+    """Parse trade blocks into trades, recording each trade's position under its symbol in grouped."""
+    # Lines are consumed one at a time, so a file object is parsed without reading it all into memory
+    lines = (line for line in map(str.strip, lines) if line)
+    trades = [] if trades is None else trades
+    grouped = defaultdict(list) if grouped is None else grouped
+
+    for line in lines:
+        header = TRADE_HEADER.match(line)
+        if header:
+            trade_date, action = header.groups()
+            next(lines)  # "Trade Details"
+
+            symbol = next(lines)
+            next(lines)  # company name
+
+            quantity = int(next(lines))
+
+            price_total_parts = next(lines).split()
+            price = float(price_total_parts[0].translate(CURRENCY_CHARS))
+            total = float(price_total_parts[-1].translate(CURRENCY_CHARS))
+
+            grouped[symbol].append(len(trades))
+            trades.append(Trade(trade_date, symbol, action, quantity, price, total, 0.00, abs(total)))
+    return trades, grouped
+
+def trade_columns(trades):
+    """Numeric trade fields as parallel arrays: costs, quantities, prices and trade dates."""
+    n = len(trades)
+    costs = np.fromiter(map(attrgetter('cost'), trades), dtype=np.float64, count=n)
+    quantities = np.fromiter(map(attrgetter('quantity'), trades), dtype=np.int64, count=n)
+    prices = np.fromiter(map(attrgetter('price'), trades), dtype=np.float64, count=n)
+    # TRADE_HEADER guarantees MM/DD/YYYY, so reorder to ISO and let NumPy parse every date in one cast
+    trade_dates = np.array([f"{t.trade_date[6:]}-{t.trade_date[:2]}-{t.trade_date[3:5]}" for t in trades],
+                           dtype='datetime64[D]')
+    return costs, quantities, prices, trade_dates
+
+def calculate_interests(costs, trade_dates, today, rate=0.05):
+    """Simple interest on every trade's cost from its trade date to today, in one vectorized pass."""
+    days = (np.datetime64(today, 'D') - trade_dates).astype(np.int64)
+    return costs * rate * days / 365
+
+def calculate_breakevens(costs, interests, quantities):
+    """Per-share breakeven for every trade: cost plus interest over quantity, to the cent."""
+    return np.round((costs + interests) / quantities, 2)
+
+def export_summary_csv(symbol, lot_rows, summary_data, timestamp):
+    filename = f"{symbol}-{timestamp}.csv"
     with open(filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["Section", "Trade Date", "Quantity", "Price", "Interest", "Breakeven", "Risk Note"])
-
-        # Summary row
-        writer.writerow([
-            "SUMMARY", "", summary_data['Total Qty'], summary_data['Highest Price'],
-            round(summary_data['Total Interest'], 2), summary_data['Final Breakeven'], ""
-        ])
-
+        rows = [
+            ["Section", "Trade Date", "Quantity", "Price", "Interest", "Breakeven", "Risk Note"],
+            # Summary row
+            ["SUMMARY", "", summary_data['Total Qty'], summary_data['Highest Price'],
+             round(summary_data['Total Interest'], 2), summary_data['Final Breakeven'], ""]
+        ]
         # Lot-level rows
-        for lot in lot_flags:
-            writer.writerow([
-                "LOT BREAKDOWN", lot['date'], lot['quantity'], lot['price'],
-                round(lot['interest'], 2), lot['breakeven'], lot['risk']
-            ])
+        rows.extend(
+            ["LOT BREAKDOWN", lot_date, quantity, price, round(interest, 2), breakeven, risk]
+            for lot_date, quantity, price, interest, breakeven, risk in lot_rows
+        )
+        csv.writer(csvfile).writerows(rows)
 
-    print(f"\n📁 Exported: {filename}")
+    return filename
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("-i", help="Input file name", type=str)
+    parser.add_argument("-i", help="Input file name(s)", type=str, nargs='+')
     parser.add_argument("-c", help="Input from command line", action='store_true')
     args = parser.parse_args()
+    today = date.today()
 
     if args.i:
-        with open(args.i, 'r') as file:
-            content = file.read()
+        # Several exports can be processed in one run, sharing a single append to trades.csv
+        trades, grouped = [], defaultdict(list)
+        for path in args.i:
+            with open(path, 'r') as file:
+                parse_multiple_trades(file, trades, grouped)
     elif args.c:
         print("Paste the trade details and press Enter twice:")
-        content = ""
+        pasted = []
         while True:
             try:
                 line = input()
                 if not line.strip():
                     break
-                content += line + "\n"
+                pasted.append(line)
             except EOFError:
                 break
+        trades, grouped = parse_multiple_trades(pasted)
     else:
         print("You must provide either -i or -c.")
         return
 
-    trades = parse_multiple_trades(content)
-
     # CSV append
     filename = "trades.csv"
     file_exists = os.path.isfile(filename)
-    with open(filename, 'a', newline='') as csvfile:
-        fieldnames = ['Trade date', 'Symbol', 'Action', 'Quantity', 'Price', 'Total', 'Commission']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    with open(filename, 'a', newline='', buffering=TRADES_CSV_BUFFER) as csvfile:
+        writer = csv.writer(csvfile)
         if not file_exists:
-            writer.writeheader()
-
-        print("\nTrade Breakdown:")
-        print("Trade Date   Symbol   Qty   Price   Interest   Breakeven")
-        print("----------------------------------------------------------")
-
-        for trade in trades:
-            writer.writerow(trade)
-            interest = calculate_interest(abs(trade['Total']), trade['Trade date'])
-            breakeven_price = calculate_breakeven(trade['Total'], interest, trade['Quantity'])
-            print(f"{trade['Trade date']:11} {trade['Symbol']:7} {trade['Quantity']:5} "
-                  f"{trade['Price']:6.2f}   {interest:7.2f}     {breakeven_price:7.2f}")
-
-    # Group and summarize by symbol
-    grouped = defaultdict(list)
-    for trade in trades:
-        grouped[trade['Symbol']].append(trade)
-
-    print("\nSymbol Summary:")
-
-    for symbol, lots in grouped.items():
-        total_quantity = sum(t['Quantity'] for t in lots)
-        total_cost = sum(abs(t['Total']) for t in lots)
-
-        lot_breakevens = []
-        lot_flags = []
-        highest_price = max(t['Price'] for t in lots)
-        total_interest = 0.0
-
-        for t in lots:
-            interest = calculate_interest(abs(t['Total']), t['Trade date'])
-            total_interest += interest
-            lot_breakeven = calculate_breakeven(t['Total'], interest, t['Quantity'])
-            lot_breakevens.append(lot_breakeven)
-
-            risk = "⚠️" if lot_breakeven > max(highest_price, max(lot_breakevens)) else "-"
-            lot_flags.append({
-                'date': t['Trade date'],
-                'price': t['Price'],
-                'quantity': t['Quantity'],
-                'interest': interest,
-                'breakeven': lot_breakeven,
-                'risk': risk
-            })
-
-        final_breakeven = max(max(lot_breakevens), highest_price)
-
-        print("\n" + "-"*70)
-        print(f"Symbol: {symbol}")
-        print(f"{'Total Qty':<12}{'Total Cost':<14}{'Highest Buy':<14}"
-              f"{'Interest':<12}{'Breakeven':<12}")
-        print(f"{total_quantity:<12}{total_cost:<14.2f}{highest_price:<14.2f}"
-              f"{total_interest:<12.2f}{final_breakeven:<12.2f}")
-
-        print("\nLot Breakdown:")
-        print("Trade Date   Qty   Price   Interest   Breakeven   Risk")
-        print("-------------------------------------------------------------")
-        for lot in lot_flags:
-            print(f"{lot['date']:11} {lot['quantity']:5} {lot['price']:7.2f}   "
-                  f"{lot['interest']:7.2f}     {lot['breakeven']:7.2f}   {lot['risk']}")
-
-        export_summary_csv(symbol, lot_flags, {
+            writer.writerow(TRADE_FIELDS)
+        writer.writerows(t[:len(TRADE_FIELDS)] for t in trades)
+
+    # The report is collected here and written to stdout in one go at the end
+    out = ["\nTrade Breakdown:\n",
+           "Trade Date   Symbol   Qty   Price   Interest   Breakeven\n",
+           "----------------------------------------------------------\n"]
+
+    costs, quantities, prices, trade_dates = trade_columns(trades)
+    interests = calculate_interests(costs, trade_dates, today)
+    breakevens = calculate_breakevens(costs, interests, quantities)
+    for trade, interest, breakeven_price in zip(trades, interests, breakevens):
+        out.append(TRADE_LINE.format(trade.trade_date, trade.symbol, trade.quantity,
+                                     trade.price, interest, breakeven_price))
+
+    # Per-symbol aggregates in one pass each; codes number the symbols in first-seen order
+    codes = np.empty(len(trades), dtype=np.int64)
+    for code, positions in enumerate(grouped.values()):
+        codes[positions] = code
+    total_quantities = np.bincount(codes, weights=quantities, minlength=len(grouped)).astype(np.int64)
+    total_costs = np.bincount(codes, weights=costs, minlength=len(grouped))
+    total_interests = np.bincount(codes, weights=interests, minlength=len(grouped))
+    highest_prices = np.full(len(grouped), -np.inf)
+    np.maximum.at(highest_prices, codes, prices)
+
+    out.append("\nSymbol Summary:\n")
+    # Every per-symbol file from this run shares one timestamp
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    for code, (symbol, positions) in enumerate(grouped.items()):
+        lot_interests = interests[positions]
+        lot_breakevens = breakevens[positions]
+        total_quantity = total_quantities[code]
+        total_cost = total_costs[code]
+        highest_price = highest_prices[code]
+        total_interest = total_interests[code]
+
+        # A lot is at risk when its breakeven exceeds the highest buy and every earlier lot's breakeven
+        prior_max = np.maximum.accumulate(np.concatenate(([highest_price], lot_breakevens[:-1])))
+        risks = np.where(lot_breakevens > prior_max, "⚠️", "-").tolist()
+        final_breakeven = max(prior_max[-1], lot_breakevens[-1])
+
+        # (date, quantity, price, interest, breakeven, risk) per lot, zipped straight from the columns
+        lot_rows = list(zip([trades[p].trade_date for p in positions], quantities[positions], prices[positions],
+                            lot_interests, lot_breakevens, risks))
+
+        out.append("\n" + "-"*70 + "\n")
+        out.append(f"Symbol: {symbol}\n")
+        out.append(f"{'Total Qty':<12}{'Total Cost':<14}{'Highest Buy':<14}"
+                   f"{'Interest':<12}{'Breakeven':<12}\n")
+        out.append(f"{total_quantity:<12}{total_cost:<14.2f}{highest_price:<14.2f}"
+                   f"{total_interest:<12.2f}{final_breakeven:<12.2f}\n")
+
+        out.append("\nLot Breakdown:\n")
+        out.append("Trade Date   Qty   Price   Interest   Breakeven   Risk\n")
+        out.append("-------------------------------------------------------------\n")
+        out.extend(LOT_LINE.format(*lot) for lot in lot_rows)
+
+        exported = export_summary_csv(symbol, lot_rows, {
             'Total Qty': total_quantity,
             'Highest Price': highest_price,
             'Total Interest': total_interest,
             'Final Breakeven': final_breakeven
-        })
+        }, timestamp)
+        out.append(f"\n📁 Exported: {exported}\n")
+
+    sys.stdout.write("".join(out))
 
 if __name__ == "__main__":
     main()